@@ -33,7 +33,7 @@ PACKAGE_VERSION="v201902.0002-beta"
 # - pypy3.5
 
 DEFAULT_PYTHON_VERSION="python=3.7"
-SUPPORTED_PYTHON_VERSIONS="python=2.7 python=3.4 python=3.7 pypy3.5"
+SUPPORTED_PYTHON_VERSIONS="python=3.7"
 
 
 # 1: Disables a failsafe for publishing to pypi
@@ -28,6 +28,18 @@ install_requires = [
 long_description = "\n\n".join((read("README.md"), read("CHANGELOG.md")))
 
 
+# The C implementation of the parser is optional. If Cython is not
+# installed, the package is pure python.
+try:
+    from Cython.Build import cythonize
+
+    ext_modules = cythonize(
+        [setuptools.Extension("pyzpl._parser", ["src/pyzpl/_parser.pyx"])]
+    )
+except ImportError:
+    ext_modules = []
+
+
 setuptools.setup(
     name="pyzpl",
     license="MIT",
@@ -42,12 +54,13 @@ setuptools.setup(
     packages=["pyzpl", "pyzpl2"],
     package_dir={"": "src"},
     install_requires=install_requires,
+    ext_modules=ext_modules,
     # entry_points="""
     #     [console_scripts]
     #     zpl=pyzpl.__main__:cli
     # """,
-    python_requires=">=2.7",
-    zip_safe=True,
+    python_requires=">=3.7",
+    zip_safe=not ext_modules,
 
     # See https://pypi.python.org/pypi?%3Aaction=list_classifiers
     classifiers=[
@@ -61,10 +74,7 @@ setuptools.setup(
         "Operating System :: MacOS :: MacOS X",
         "Operating System :: Microsoft :: Windows",
         "Programming Language :: Python",
-        "Programming Language :: Python :: 2.7",
-        "Programming Language :: Python :: 3.4",
-        "Programming Language :: Python :: 3.5",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3",
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: Implementation :: CPython",
         "Programming Language :: Python :: Implementation :: PyPy",
@@ -54,135 +54,274 @@ The following sequences are treated as line-endings:
 
 """
 
-from __future__ import division
-from __future__ import print_function
-from __future__ import absolute_import
-from __future__ import unicode_literals
-
 __version__ = "v201902.0002-beta"
 
-import io
-import re
 import sys
-import collections
-import operator as op
+import codecs
+import string
+import functools
 
-PY2 = sys.version_info.major < 3
 
-str = unicode if PY2 else str  # noqa
+_NAME_CHARS = (string.ascii_letters + string.digits + "$_-@.&+/").encode("ascii")
 
-vitems = op.methodcaller('viewitems') if PY2 else op.methodcaller('items')
+# lookup table indexed by byte value, a property line starts with a name-char
+_IS_NAME_START = bytes(byte in _NAME_CHARS for byte in range(256))
 
+_QUOTE_CHARS = (b'"', b"'")
 
-NAME_RE = re.compile(r"^(?P<propname>[A-Z0-9\$_\-@\.&+/]+).*$", re.VERBOSE | re.IGNORECASE)
+# Encodings in which the structural characters of ZPL (whitespace, '#',
+# '=' and quotes) are single ascii bytes that can't be part of any other
+# character. Lines in these encodings are parsed without decoding them.
+_ASCII_COMPATIBLE_CODECS = frozenset(["ascii", "utf-8", "iso8859-1", "iso8859-15", "cp1252"])
 
 
-NAME_VALUE_PAIR_RE = re.compile(
-    r"""
-    ^
-    (?P<propname>[A-Z0-9\$_\-@\.&+/]+)
-    \s*=\s*
-    \"?
-    (?P<propvalue>[^\"]+?)
-    \"?
-    (?P<trailing_comment>\s*\#.*?)?
-    $
-""",
-    re.VERBOSE | re.IGNORECASE,
-)
+_INDENTS = tuple("    " * depth for depth in range(32))
 
 
-def load_stream(bytes_stream, encoding='utf-8'):
-    propname_stack  = tuple()
+def _parse_value(raw_value):
+    """Strip enclosing quotes or a trailing comment from a raw value.
+
+    A value that starts with a quote but has no matching closing
+    quote is treated as unquoted.
+    """
+    value = raw_value.strip()
+    quote = value[:1]
+    if quote in _QUOTE_CHARS:
+        end = value.find(quote, 1)
+        if end > 0:
+            return value[1:end]
+    comment = value.find(b"#")
+    if comment >= 0:
+        value = value[:comment].rstrip()
+    return value
+
+
+def _split_lines(bytes_stream):
+    # File and BytesIO iteration only split at b"\n", but a lone
+    # carriage-return is a line-ending too.
+    for chunk in bytes_stream:
+        if b"\r" in chunk:
+            yield from chunk.splitlines()
+        else:
+            yield chunk
+
+
+def _transcode_lines(bytes_stream, encoding):
+    # The chunks of bytes_stream are split at b"\n" bytes, which in encodings
+    # like utf-16 are not line endings. The decoded text is re-encoded to utf-8
+    # and split again, a partial line is carried over to the next chunk.
+    pending = b""
+    for text in codecs.iterdecode(bytes_stream, encoding):
+        lines   = (pending + text.encode("utf-8")).splitlines(keepends=True)
+        pending = b""
+        if lines and not lines[-1].endswith((b"\n", b"\r")):
+            pending = lines.pop()
+        yield from lines
+
+    if pending:
+        yield pending
+
+
+def _py_load_lines(byte_lines, encoding):
+    # bind globals used per line as locals
+    name_chars  = _NAME_CHARS
+    name_start  = _IS_NAME_START
+    parse_value = _parse_value
+    intern      = sys.intern
+
+    propname_stack  = []
     prev_indent_lvl = 0
-    for lineno, raw_line in enumerate(bytes_stream):
-        decoded_line = raw_line.decode(encoding)
-        cleaned_line = decoded_line.rstrip("\r\n")
-        line         = cleaned_line.lstrip(" ")
+    for lineno, raw_line in enumerate(byte_lines):
+        cleaned_line = raw_line.rstrip(b"\r\n")
+        line         = cleaned_line.lstrip(b" ")
         if not line:
             continue
         spaces = len(cleaned_line) - len(line)
 
         if spaces % 4 != 0:
             msgfmt = "Illegal indent on line {}, must be a multiple of 4\n\t{}"
-            raise ValueError(msgfmt.format(spaces, repr(cleaned_line)))
+            raise ValueError(msgfmt.format(lineno + 1, repr(cleaned_line.decode(encoding))))
 
         indent_lvl = spaces // 4
         if indent_lvl <= prev_indent_lvl:
-            propname_stack = propname_stack[:indent_lvl]
-
-        nv_pair_match = NAME_VALUE_PAIR_RE.match(line)
-        if nv_pair_match:
-            propname        = nv_pair_match.group(1).strip()
-            value           = nv_pair_match.group(2)
-            propnames       = propname_stack + (propname,)
-            prev_indent_lvl = indent_lvl
-            yield propnames, value
-        else:
-            propname_match = NAME_RE.match(line)
-            if propname_match:
-                propname_stack += (propname_match.group(1),)
-                prev_indent_lvl = indent_lvl
+            del propname_stack[indent_lvl:]
+
+        if not name_start[line[0]]:
+            continue  # comments and other lines that can't define a property
+
+        value = None
+        propname, eq, raw_value = line.partition(b"=")
+        if eq:
+            propname = propname.rstrip()
+            if propname and not propname.translate(None, name_chars):
+                value = parse_value(raw_value)
+
+        if not value:
+            propname = line[: len(line) - len(line.lstrip(name_chars))]
+
+        # names repeat a lot, interned names share memory and hash/compare faster
+        propname_stack.append(intern(propname.decode("ascii")))
+        prev_indent_lvl = indent_lvl
+        if value:
+            yield tuple(propname_stack), value.decode(encoding)
+            propname_stack.pop()
+
+
+def _py_load_buffer(data, encoding):
+    # splitlines is a single pass in C, and it also treats a lone
+    # carriage-return as a line-ending, just as load_stream does.
+    return _py_load_lines(data.splitlines(), encoding)
+
+
+try:
+    # C implementations, only available if the package was built with Cython
+    from ._parser import load_lines as _load_lines
+    from ._parser import load_buffer as _load_buffer
+except ImportError:
+    _load_lines  = _py_load_lines
+    _load_buffer = _py_load_buffer
 
 
-def load(
-    bytes_stream, encoding='utf-8', flat=False, name_sep=":", dict_cls=collections.OrderedDict
-):
+def _is_ascii_compatible(encoding):
+    return codecs.lookup(encoding).name in _ASCII_COMPATIBLE_CODECS
 
+
+def load_stream(bytes_stream, encoding='utf-8'):
+    if _is_ascii_compatible(encoding):
+        bytes_stream = _split_lines(bytes_stream)
+    else:
+        bytes_stream = _transcode_lines(bytes_stream, encoding)
+        encoding     = "utf-8"
+
+    return _load_lines(bytes_stream, encoding)
+
+
+def _build_tree(items, flat, name_sep, dict_cls):
     tree = dict_cls()
-    for propnames, value in load_stream(bytes_stream, encoding=encoding):
+    # ctx_stack[depth] is the dict of prev_names[:depth]
+    ctx_stack  = [tree]
+    prev_names = ()
+    for propnames, value in items:
         if flat:
             flatkey = name_sep.join(propnames)
             tree[flatkey] = value
         else:
-            ctx = tree
-            for subkey in propnames[:-1]:
-                if subkey not in ctx:
-                    ctx[subkey] = dict_cls()
-                ctx = ctx[subkey]
-            ctx[propnames[-1]] = value
+            parent_names = propnames[:-1]
+            if parent_names != prev_names:
+                # unwind to the parents shared with the previous property
+                depth = 0
+                for prev_name, name in zip(prev_names, parent_names):
+                    if prev_name != name:
+                        break
+                    depth += 1
+                del ctx_stack[depth + 1 :]
+
+                ctx = ctx_stack[-1]
+                for subkey in parent_names[depth:]:
+                    node = ctx.get(subkey)
+                    if node is None:
+                        node = ctx[subkey] = dict_cls()
+                    elif isinstance(node, str):
+                        flatkey = name_sep.join(parent_names[: len(ctx_stack)])
+                        raise ValueError("Property '{}' has both a value and children".format(flatkey))
+                    ctx_stack.append(node)
+                    ctx = node
+                prev_names = parent_names
+
+            ctx_stack[-1][propnames[-1]] = value
 
     return tree
 
 
-def loads(data, *args, **kwargs):
-    return load(io.BytesIO(data), *args, **kwargs)
+def load(bytes_stream, encoding='utf-8', flat=False, name_sep=":", dict_cls=dict):
+
+    items = load_stream(bytes_stream, encoding=encoding)
+    return _build_tree(items, flat, name_sep, dict_cls)
+
+
+@functools.lru_cache(maxsize=128)
+def _loads_items(data, encoding):
+    if not _is_ascii_compatible(encoding):
+        data     = data.decode(encoding).encode("utf-8")
+        encoding = "utf-8"
+
+    return tuple(_load_buffer(data, encoding))
+
 
+def clear_loads_cache():
+    """Drop the inputs and parse results cached by loads."""
+    _loads_items.cache_clear()
 
-def dump_lines(tree_items, name_sep=":"):
+
+def loads(data, encoding='utf-8', flat=False, name_sep=":", dict_cls=dict):
+    """tree = loads(data, encoding='utf-8', flat=False, name_sep=':', dict_cls=dict)
+
+    Like load, but for ZPL data as bytes.
+
+    The parse results of the 128 most recently used inputs are cached, keyed by
+    data and encoding. Loading the same data again only costs building the tree, which is
+    new for each call, so the caller is free to modify it. The cache keeps references to
+    these inputs and results until they are evicted or clear_loads_cache() is called.
+    For data that is only loaded once, the cache costs one hash of the data.
+    """
+    items = _loads_items(bytes(data), encoding)
+    return _build_tree(items, flat, name_sep, dict_cls)
+
+
+def _indent(depth):
+    if depth < len(_INDENTS):
+        return _INDENTS[depth]
+    return "    " * depth
+
+
+def dump_lines(tree_items, name_sep=":", depth=0):
+    base_indent  = _indent(depth)
+    prev_parents = ()
     for name, val in tree_items:
-        if isinstance(name, str) and name_sep in name:
-            name = name.split(name_sep)
-        if isinstance(name, (tuple, list)):
-            # TODO (mb 2016-11-23): handle indent
-            indent = ""
-            for parent_name in name[:-1]:
-                yield indent + parent_name
-                indent += "    "
-            name = name[-1]
+        if isinstance(name, str) and name_sep not in name:
+            name_depth   = depth
+            indent       = base_indent
+            prev_parents = ()
         else:
-            indent = ""
-
-        if isinstance(val, dict):
-            yield name
-            sub_items = vitems(val)
-            for subline in dump_lines(sub_items):
-                yield "    " + subline
-            continue
+            # flat name, either name_sep delimited or a sequence of parts
+            if isinstance(name, str):
+                name = name.split(name_sep)
+            parents = tuple(name[:-1])
+
+            # parents shared with the previous flat name have already been dumped
+            shared = 0
+            for prev_parent, parent in zip(prev_parents, parents):
+                if prev_parent != parent:
+                    break
+                shared += 1
+            for parent_depth in range(shared, len(parents)):
+                yield f"{_indent(depth + parent_depth)}{parents[parent_depth]}"
+
+            prev_parents = parents
+            name_depth   = depth + len(parents)
+            name         = name[-1]
+            indent       = _indent(name_depth)
 
         if not isinstance(val, str):
+            if isinstance(val, dict):
+                yield f"{indent}{name}"
+                yield from dump_lines(val.items(), name_sep, name_depth + 1)
+                continue
+
             val = str(val)
 
-        if "#" in val:
-            val_str = '"' + val + '"'
+        if "#" in val or val.startswith(('"', "'")):
+            # there is no escaping in ZPL, so quote with the other kind of quote
+            quote   = "'" if '"' in val else '"'
+            val_str = f"{quote}{val}{quote}"
         else:
             val_str = val
 
-        yield indent + name + " = " + val_str
+        yield f"{indent}{name} = {val_str}"
 
 
 def dumps(tree, *args, **kwargs):
-    lines = dump_lines(vitems(tree), *args, **kwargs)
+    lines = dump_lines(tree.items(), *args, **kwargs)
     return "\n".join(lines) + "\n"
 
 
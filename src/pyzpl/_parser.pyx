@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# cython: language_level=3
+# This file is part of the pyzpl project
+# https://gitlab.com/mbarkhau/pyzpl
+#
+# Copyright (c) 2019 Manuel Barkhau (mbarkhau@gmail.com) - MIT License
+# SPDX-License-Identifier: MIT
+
+"""C implementation of pyzpl._py_load_lines
+
+The lines are scanned directly on their char buffers. Python objects
+are only created for the names and values that are yielded.
+"""
+
+from sys import intern
+
+cdef bytes NAME_CHARS = (
+    b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789$_-@.&+/"
+)
+
+# character classes, bit flags of CHAR_CLASS
+cdef enum:
+    NAME  = 1
+    SPACE = 2   # same as bytes.strip()
+    EOL   = 4   # same as bytes.splitlines()
+    QUOTE = 8
+
+# lookup table of character classes, indexed by byte value
+cdef unsigned char CHAR_CLASS[256]
+
+cdef int _i
+for _i in range(256):
+    CHAR_CLASS[_i] = 0
+for _i in NAME_CHARS:
+    CHAR_CLASS[_i] |= NAME
+for _i in b" \t\n\r\x0b\x0c":
+    CHAR_CLASS[_i] |= SPACE
+for _i in b"\n\r":
+    CHAR_CLASS[_i] |= EOL
+for _i in b"\"'":
+    CHAR_CLASS[_i] |= QUOTE
+
+
+cdef class _LineParser:
+
+    cdef str encoding
+    cdef list propname_stack
+    cdef Py_ssize_t prev_indent_lvl
+    cdef Py_ssize_t lineno
+
+    def __cinit__(self, str encoding):
+        self.encoding        = encoding
+        self.propname_stack  = []
+        self.prev_indent_lvl = 0
+        self.lineno          = 0
+
+    cdef object parse(self, const unsigned char* buf, Py_ssize_t start, Py_ssize_t end):
+        """Parse buf[start:end], return (propnames, value) or None."""
+        cdef Py_ssize_t eq, name_end, pos
+        cdef Py_ssize_t val_start = 0
+        cdef Py_ssize_t val_end   = 0
+        cdef Py_ssize_t spaces, indent_lvl
+        cdef unsigned char quote
+        cdef bint has_value
+        cdef list propname_stack = self.propname_stack
+
+        self.lineno += 1
+        while end > start and CHAR_CLASS[buf[end - 1]] & EOL:
+            end -= 1
+        pos = start
+        while start < end and buf[start] == b' ':
+            start += 1
+        if start == end:
+            return None
+        spaces = start - pos
+
+        if spaces % 4 != 0:
+            msgfmt = "Illegal indent on line {}, must be a multiple of 4\n\t{}"
+            raise ValueError(msgfmt.format(self.lineno, repr(buf[pos:end].decode(self.encoding))))
+
+        indent_lvl = spaces // 4
+        if indent_lvl <= self.prev_indent_lvl:
+            del propname_stack[indent_lvl:]
+
+        if not CHAR_CLASS[buf[start]] & NAME:
+            return None  # comments and other lines that can't define a property
+
+        has_value = False
+        eq = start
+        while eq < end and buf[eq] != b'=':
+            eq += 1
+
+        if start < eq < end:
+            name_end = eq
+            while name_end > start and CHAR_CLASS[buf[name_end - 1]] & SPACE:
+                name_end -= 1
+            pos = start
+            while pos < name_end and CHAR_CLASS[buf[pos]] & NAME:
+                pos += 1
+
+            if name_end > start and pos == name_end:
+                val_start = eq + 1
+                val_end   = end
+                while val_start < val_end and CHAR_CLASS[buf[val_start]] & SPACE:
+                    val_start += 1
+                while val_end > val_start and CHAR_CLASS[buf[val_end - 1]] & SPACE:
+                    val_end -= 1
+
+                quote = buf[val_start] if val_start < val_end else 0
+                pos   = val_start + 1
+                if CHAR_CLASS[quote] & QUOTE:
+                    while pos < val_end and buf[pos] != quote:
+                        pos += 1
+                if CHAR_CLASS[quote] & QUOTE and pos < val_end:
+                    val_start += 1
+                    val_end    = pos
+                else:
+                    pos = val_start
+                    while pos < val_end and buf[pos] != b'#':
+                        pos += 1
+                    if pos < val_end:
+                        val_end = pos
+                        while val_end > val_start and CHAR_CLASS[buf[val_end - 1]] & SPACE:
+                            val_end -= 1
+
+                has_value = val_end > val_start
+
+        if not has_value:
+            name_end = start
+            while name_end < end and CHAR_CLASS[buf[name_end]] & NAME:
+                name_end += 1
+
+        propname_stack.append(intern(buf[start:name_end].decode('ascii')))
+        self.prev_indent_lvl = indent_lvl
+        if not has_value:
+            return None
+
+        propnames = tuple(propname_stack)
+        propname_stack.pop()
+        return propnames, buf[val_start:val_end].decode(self.encoding)
+
+
+def load_lines(byte_lines, str encoding):
+    cdef _LineParser parser = _LineParser(encoding)
+    cdef bytes line
+
+    for raw_line in byte_lines:
+        line = raw_line if type(raw_line) is bytes else bytes(raw_line)
+        item = parser.parse(line, 0, len(line))
+        if item is not None:
+            yield item
+
+
+def load_buffer(bytes data, str encoding):
+    """Like load_lines, but for the complete input as one buffer.
+
+    Lines are parsed where they are in data, no object is created per line.
+    Line endings are the same as for bytes.splitlines: '\\n', '\\r' and '\\r\\n'.
+    Since all of data is available anyway, the items are returned as a list
+    rather than yielded one at a time.
+    """
+    cdef _LineParser parser = _LineParser(encoding)
+    cdef const unsigned char* buf = data
+    cdef Py_ssize_t size = len(data)
+    cdef Py_ssize_t pos  = 0
+    cdef Py_ssize_t eol
+    cdef list items = []
+
+    while pos < size:
+        eol = pos
+        while eol < size and not CHAR_CLASS[buf[eol]] & EOL:
+            eol += 1
+
+        item = parser.parse(buf, pos, eol)
+        if item is not None:
+            items.append(item)
+
+        if eol + 1 < size and buf[eol] == b'\r' and buf[eol + 1] == b'\n':
+            eol += 1
+        pos = eol + 1
+
+    return items
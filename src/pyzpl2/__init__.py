@@ -53,45 +53,119 @@ The following sequences are treated as line-endings:
 
 """
 
-from __future__ import division
-from __future__ import print_function
-from __future__ import absolute_import
-from __future__ import unicode_literals
-
-import io
-import re
 import sys
-import collections
-import operator
+import codecs
+import string
+import functools
 
 __version__ = "v201902.0001-beta"
 
-PY2 = sys.version_info.major < 3
 
-if PY2:
-    str    = unicode
-    vitems = operator.methodcaller('viewitems')
-else:  # python 3
-    # str supports necessary decode
-    vitems = operator.methodcaller('items')
+_NAME_CHARS = (string.ascii_letters + string.digits + "$_-@.&+/").encode("ascii")
+
+# lookup table indexed by byte value, a property line starts with a name-char
+_IS_NAME_START = bytes(byte in _NAME_CHARS for byte in range(256))
+
+_QUOTE_CHARS = (b'"', b"'")
+
+# Encodings in which the structural characters of ZPL (whitespace, '#',
+# '=' and quotes) are single ascii bytes that can't be part of any other
+# character. Lines in these encodings are parsed without decoding them.
+_ASCII_COMPATIBLE_CODECS = frozenset(["ascii", "utf-8", "iso8859-1", "iso8859-15", "cp1252"])
+
+
+_INDENTS = tuple("    " * depth for depth in range(32))
+
+
+def _parse_value(raw_value):
+    """Strip enclosing quotes or a trailing comment from a raw value.
+
+    A value that starts with a quote but has no matching closing
+    quote is treated as unquoted.
+    """
+    value = raw_value.strip()
+    quote = value[:1]
+    if quote in _QUOTE_CHARS:
+        end = value.find(quote, 1)
+        if end > 0:
+            return value[1:end]
+    comment = value.find(b"#")
+    if comment >= 0:
+        value = value[:comment].rstrip()
+    return value
+
+
+def _split_lines(bytes_stream):
+    # File and BytesIO iteration only split at b"\n", but a lone
+    # carriage-return is a line-ending too.
+    for chunk in bytes_stream:
+        if b"\r" in chunk:
+            yield from chunk.splitlines()
+        else:
+            yield chunk
+
+
+def _transcode_lines(bytes_stream, encoding):
+    # The chunks of bytes_stream are split at b"\n" bytes, which in encodings
+    # like utf-16 are not line endings. The decoded text is re-encoded to utf-8
+    # and split again, a partial line is carried over to the next chunk.
+    pending = b""
+    for text in codecs.iterdecode(bytes_stream, encoding):
+        lines   = (pending + text.encode("utf-8")).splitlines(keepends=True)
+        pending = b""
+        if lines and not lines[-1].endswith((b"\n", b"\r")):
+            pending = lines.pop()
+        yield from lines
+
+    if pending:
+        yield pending
+
 
+def _load_lines(byte_lines, encoding, emit_empty):
+    # bind globals used per line as locals
+    name_chars  = _NAME_CHARS
+    name_start  = _IS_NAME_START
+    parse_value = _parse_value
+    intern      = sys.intern
 
-NAME_RE = re.compile(r"^(?P<propname>[A-Z0-9\$_\-@\.&+/]+).*$", re.VERBOSE | re.IGNORECASE)
+    propname_stack  = []
+    prev_indent_lvl = 0
+    for lineno, raw_line in enumerate(byte_lines):
+        cleaned_line = raw_line.rstrip(b"\r\n")
+        line         = cleaned_line.lstrip(b" ")
+        if not line:
+            continue  # skip blank lines
+        spaces = len(cleaned_line) - len(line)
 
+        if spaces % 4 != 0:
+            msgfmt = "Illegal indent on line {}, must be a multiple of 4\n\t{}"
+            raise ValueError(msgfmt.format(lineno + 1, repr(cleaned_line.decode(encoding))))
 
-NAME_VALUE_PAIR_RE = re.compile(
-    r"""
-    ^
-    (?P<propname>[A-Z0-9\$_\-@\.&+/]+)
-    \s*=\s*
-    \"?
-    (?P<propvalue>[^\"]+?)
-    \"?
-    (?P<trailing_comment>\s*\#.*?)?
-    $
-""",
-    re.VERBOSE | re.IGNORECASE,
-)
+        indent_lvl = spaces // 4
+        if indent_lvl <= prev_indent_lvl:
+            del propname_stack[indent_lvl:]
+            # this represents an outdent?
+
+        if not name_start[line[0]]:
+            continue  # comments and other lines that can't define a property
+
+        value = None
+        propname, eq, raw_value = line.partition(b"=")
+        if eq:
+            propname = propname.rstrip()
+            # a valid name has nothing left after deleting all name-chars
+            if propname and not propname.translate(None, name_chars):
+                value = parse_value(raw_value)
+
+        if not value:
+            # the name of a value-less node is the leading run of name-chars
+            propname = line[: len(line) - len(line.lstrip(name_chars))]
+
+        # names repeat a lot, interned names share memory and hash/compare faster
+        propname_stack.append(intern(propname.decode("ascii")))
+        prev_indent_lvl = indent_lvl
+        if value or emit_empty:
+            yield tuple(propname_stack), value.decode(encoding) if value else ""
 
 
 def load_stream(bytes_stream, encoding='utf-8', emit_empty=False):
@@ -110,43 +184,54 @@ def load_stream(bytes_stream, encoding='utf-8', emit_empty=False):
     As a stream parser, it carries no state (other that the property's place in the hierarchy).
     """
 
-    propname_stack  = tuple()
-    prev_indent_lvl = 0
-    for lineno, raw_line in enumerate(bytes_stream):
-        decoded_line = raw_line.decode(encoding)
-        cleaned_line = decoded_line.rstrip("\r\n")
-        line         = cleaned_line.lstrip(" ")
-        if not line:
-            continue  # skip blank lines
-        spaces = len(cleaned_line) - len(line)
+    if codecs.lookup(encoding).name in _ASCII_COMPATIBLE_CODECS:
+        bytes_stream = _split_lines(bytes_stream)
+    else:
+        bytes_stream = _transcode_lines(bytes_stream, encoding)
+        encoding     = "utf-8"
 
-        if spaces % 4 != 0:
-            msgfmt = "Illegal indent on line {}, must be a multiple of 4\n\t{}"
-            raise ValueError(msgfmt.format(lineno, repr(cleaned_line)))
+    return _load_lines(bytes_stream, encoding, emit_empty)
 
-        indent_lvl = spaces // 4
-        if indent_lvl <= prev_indent_lvl:
-            propname_stack = propname_stack[:indent_lvl]
-            # this represents an outdent?
 
-        nv_pair_match = NAME_VALUE_PAIR_RE.match(line)
-        if nv_pair_match:
-            propname_stack += (nv_pair_match.group(1).strip(),)
-            prev_indent_lvl = indent_lvl
-            yield propname_stack, nv_pair_match.group(2)
+def _build_tree(items, flat, name_sep, dict_cls):
+    tree = dict_cls()
+    # ctx_stack[depth] is the dict of prev_names[:depth]
+    ctx_stack  = [tree]
+    prev_names = ()
+    for propnames, value in items:
+        if flat:
+            flatkey = name_sep.join(propnames)
+            tree[flatkey] = value
         else:
-            propname_match = NAME_RE.match(line)
-            if propname_match:
-                propname_stack += (propname_match.group(1),)
-                prev_indent_lvl = indent_lvl
-                if emit_empty:
-                    yield propname_stack, ""
+            parent_names = propnames[:-1]
+            if parent_names != prev_names:
+                # unwind to the parents shared with the previous property
+                depth = 0
+                for prev_name, name in zip(prev_names, parent_names):
+                    if prev_name != name:
+                        break
+                    depth += 1
+                del ctx_stack[depth + 1 :]
+
+                ctx = ctx_stack[-1]
+                for subkey in parent_names[depth:]:
+                    node = ctx.get(subkey)
+                    if node is None:
+                        node = ctx[subkey] = dict_cls()
+                    elif isinstance(node, str):
+                        flatkey = name_sep.join(parent_names[: len(ctx_stack)])
+                        raise ValueError("Property '{}' has both a value and children".format(flatkey))
+                    ctx_stack.append(node)
+                    ctx = node
+                prev_names = parent_names
+
+            ctx_stack[-1][propnames[-1]] = value
 
+    return tree
 
-def load(
-    bytes_stream, encoding='utf-8', flat=False, name_sep=":", dict_cls=collections.OrderedDict
-):
-    """tree = load(linelist, encoding='utf-8', flat=False, name_sep=':', dict_cls=collections.OrderedDict)
+
+def load(bytes_stream, encoding='utf-8', flat=False, name_sep=":", dict_cls=dict):
+    """tree = load(linelist, encoding='utf-8', flat=False, name_sep=':', dict_cls=dict)
 
     loads a ZPL stream (an iterable yielding one line at a time) into an mapping object
     (instance of dict_cls). Internally, it calls load_stream, passing the linelist and the
@@ -154,68 +239,199 @@ def load(
 
     Note that this interface does not allow for repeated property names at the same level. The
     ZPL spec is not clear about if this is defined behavior or not. It also does not support
-    properties having both values and children.
+    properties having both values and children, for which a ValueError is raised.
     """
 
-    tree = dict_cls()
-    for propnames, value in load_stream(bytes_stream, encoding=encoding):
-        if flat:
-            flatkey = name_sep.join(propnames)
-            tree[flatkey] = value
-        else:
-            ctx = tree
-            for subkey in propnames[:-1]:
-                if subkey not in ctx:
-                    ctx[subkey] = dict_cls()
-                ctx = ctx[subkey]
-            ctx[propnames[-1]] = value
+    items = load_stream(bytes_stream, encoding=encoding)
+    return _build_tree(items, flat, name_sep, dict_cls)
 
-    return tree
+
+@functools.lru_cache(maxsize=128)
+def _loads_items(data, encoding):
+    if codecs.lookup(encoding).name not in _ASCII_COMPATIBLE_CODECS:
+        data     = data.decode(encoding).encode("utf-8")
+        encoding = "utf-8"
+
+    # splitlines is a single pass in C, and it also treats a lone
+    # carriage-return as a line-ending, just as load_stream does.
+    return tuple(_load_lines(data.splitlines(), encoding, False))
+
+
+def clear_loads_cache():
+    """Drop the inputs and parse results cached by loads."""
+    _loads_items.cache_clear()
 
 
-def loads(data, *args, **kwargs):
-    return load(io.BytesIO(data), *args, **kwargs)
+def loads(data, encoding='utf-8', flat=False, name_sep=":", dict_cls=dict):
+    """tree = loads(data, encoding='utf-8', flat=False, name_sep=':', dict_cls=dict)
 
+    Like load, but for ZPL data as bytes.
 
-def dump_lines(tree_items, name_sep=":"):
+    The parse results of the 128 most recently used inputs are cached, keyed by
+    data and encoding. Loading the same data again only costs building the tree, which is
+    new for each call, so the caller is free to modify it. The cache keeps references to
+    these inputs and results until they are evicted or clear_loads_cache() is called.
+    For data that is only loaded once, the cache costs one hash of the data.
+    """
+    items = _loads_items(bytes(data), encoding)
+    return _build_tree(items, flat, name_sep, dict_cls)
+
+
+def _indent(depth):
+    if depth < len(_INDENTS):
+        return _INDENTS[depth]
+    return "    " * depth
+
+
+def dump_lines(tree_items, name_sep=":", depth=0):
+    base_indent  = _indent(depth)
+    prev_parents = ()
     for name, val in tree_items:
-        if isinstance(name, str) and name_sep in name:
-            name = name.split(name_sep)
-        if isinstance(name, (tuple, list)):
-            # TODO (mb 2016-11-23): handle indent
-            indent = ""
-            for parent_name in name[:-1]:
-                yield indent + parent_name
-                indent += "    "
-            name = name[-1]
+        if isinstance(name, str) and name_sep not in name:
+            name_depth   = depth
+            indent       = base_indent
+            prev_parents = ()
         else:
-            indent = ""
+            # flat name, either name_sep delimited or a sequence of parts
+            if isinstance(name, str):
+                name = name.split(name_sep)
+            parents = tuple(name[:-1])
+
+            # parents shared with the previous flat name have already been dumped
+            shared = 0
+            for prev_parent, parent in zip(prev_parents, parents):
+                if prev_parent != parent:
+                    break
+                shared += 1
+            for parent_depth in range(shared, len(parents)):
+                yield f"{_indent(depth + parent_depth)}{parents[parent_depth]}"
 
-        if isinstance(val, dict):
-            yield name
-            sub_items = vitems(val)
-            for subline in dump_lines(sub_items):
-                yield "    " + subline
-            continue
+            prev_parents = parents
+            name_depth   = depth + len(parents)
+            name         = name[-1]
+            indent       = _indent(name_depth)
 
         if not isinstance(val, str):
+            if isinstance(val, dict):
+                yield f"{indent}{name}"
+                yield from dump_lines(val.items(), name_sep, name_depth + 1)
+                continue
+
             val = str(val)
 
-        if "#" in val:
-            val_str = '"' + val + '"'
+        if "#" in val or val.startswith(('"', "'")):
+            # there is no escaping in ZPL, so quote with the other kind of quote
+            quote   = "'" if '"' in val else '"'
+            val_str = f"{quote}{val}{quote}"
         else:
             val_str = val
 
-        yield indent + name + " = " + val_str
+        yield f"{indent}{name} = {val_str}"
 
 
 def dumps(tree, *args, **kwargs):
-    lines = dump_lines(vitems(tree), *args, **kwargs)
+    lines = dump_lines(tree.items(), *args, **kwargs)
     return "\n".join(lines) + "\n"
 
 
+class ZPLTree(object):
+    """ZPLTree(name=root, value=None)
+
+    The storage of a ZPL hierarchy. Instead of one object per node, the fields of all nodes
+    are kept in parallel lists, indexed by an integer node id. The root node has the id 0
+    and the id of a node is always greater than that of its parent.
+
+    Children are linked via first_child/next_sibling (-1 marks the end of a list), and
+    name_index maps (parent id, name) to the ids of the children with that name, in order
+    of appearance.
+
+    Nodes are usually accessed via ZPLnode, which is a view of a (tree, node id) pair.
+    """
+
+    __slots__ = (
+        'names',
+        'values',
+        'levels',
+        'first_child',
+        'last_child',
+        'next_sibling',
+        'name_index',
+    )
+
+    def __init__(self, name="root", value=None):
+        self.names        = [name]
+        self.values       = [value]
+        self.levels       = [0]
+        self.first_child  = [-1]
+        self.last_child   = [-1]
+        self.next_sibling = [-1]
+        self.name_index   = {}
+
+    def add(self, parent, name, value=None):
+        """Append a node as the last child of 'parent' and return its id."""
+        idx = len(self.names)
+        self.names.append(name)
+        self.values.append(value)
+        self.levels.append(self.levels[parent] + 1)
+        self.first_child.append(-1)
+        self.last_child.append(-1)
+        self.next_sibling.append(-1)
+
+        prev_sibling = self.last_child[parent]
+        if prev_sibling < 0:
+            self.first_child[parent] = idx
+        else:
+            self.next_sibling[prev_sibling] = idx
+        self.last_child[parent] = idx
+
+        self.name_index.setdefault((parent, name), []).append(idx)
+        return idx
+
+    def iter_children(self, idx):
+        """Yield the ids of the children of node 'idx' in order."""
+        next_sibling = self.next_sibling
+        child        = self.first_child[idx]
+        while child >= 0:
+            yield child
+            child = next_sibling[child]
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_selector(selector):
+    # selectors are usually literals used over and over, so they are only parsed once
+    idx = selector.find("=")
+    if idx > 0:
+        return selector[:idx], (selector[idx + 1 :],)
+    else:
+        return selector, (None,)
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_path(path, query, name_sep):
+    # paths are usually literals used over and over, so they are only parsed once
+
+    # if this is a string, turn it into a list
+    if hasattr(path, 'encode'):
+        path = path.split(name_sep)
+
+    # check the query; if it is a string, turn it into a list. If it is short, pad it with 'None'
+    if hasattr(query, 'encode'):
+        query = (query,)
+
+    if len(query) > len(path):
+        raise ValueError(
+            "too many query parameters for path", "path=" + str(path), "query=" + str(query)
+        )
+
+    # left-pad the query with None
+    query = (None,) * (len(path) - len(query)) + tuple(query)
+
+    # Turn the parts and querys into a tuple that can be sliced
+    return tuple(zip(path, query))
+
+
 class ZPLnode(object):
-    """ZPLnode(name=root, value=None)
+    """ZPLnode(name=root, value=None, parent=None)
 
     This class represents a single node in a ZPL hierarchy. Per the ZPL specification:
 
@@ -225,18 +441,43 @@ class ZPLnode(object):
 
     Also, preserving the stream-like properties of a ZPL sequence, the order in which nodes
     appear is preserved
+
+    A ZPLnode is a view of one node in a ZPLTree. Creating a ZPLnode without a parent
+    creates a new tree, with a parent the node is added as the last child of the parent.
+    Two views of the same node compare equal.
     """
 
+    __slots__ = ('_tree', '_idx')
+
     def __init__(self, **kw):
-        self._name   = kw.get("name"  , "root")
-        self._value  = kw.get("value" , None)
-        self._parent = kw.get("parent", None)
-        if self._parent:
-            self._level = self._parent._level + 1
-            self._parent._children.append(self)
+        name   = kw.get("name"  , "root")
+        value  = kw.get("value" , None)
+        parent = kw.get("parent", None)
+        if parent:
+            self._tree = parent._tree
+            self._idx  = parent._tree.add(parent._idx, name, value)
         else:
-            self._level = 0
-        self._children = []
+            self._tree = ZPLTree(name, value)
+            self._idx  = 0
+
+    @classmethod
+    def _view(cls, tree, idx):
+        node       = cls.__new__(cls)
+        node._tree = tree
+        node._idx  = idx
+        return node
+
+    def __eq__(self, other):
+        if not isinstance(other, ZPLnode):
+            return NotImplemented
+        return self._tree is other._tree and self._idx == other._idx
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    def __hash__(self):
+        return hash((id(self._tree), self._idx))
 
     def get(self, path, query=(None,), name_sep=":"):
         """get(path, query=None, name_sep=':')
@@ -281,27 +522,15 @@ class ZPLnode(object):
             assert bar.value == "bat"
         """
 
-        # if this is a string, turn it into a list
-        if hasattr(path, 'encode'):
-            path = path.split(name_sep)
-
-        # check the query; if it is a string, turn it into a list. If it is short, pad it with 'None'
-        if hasattr(query, 'encode'):
-            query = (query,)
-
-        if len(query) > len(path):
-            raise ValueError(
-                "too many query parameters for path", "path=" + str(path), "query=" + str(query)
-            )
-
-        # left-pad the query with None
-        query = (None,) * (len(path) - len(query)) + query
+        if isinstance(path, list) or isinstance(query, list):
+            # lists can't be cache keys
+            args = _parse_path.__wrapped__(path, query, name_sep)
+        else:
+            args = _parse_path(path, query, name_sep)
 
-        # Turn the parts and querys into a list that can be sliced
-        args = [x for x in zip(path, query)]
-        match, node = self.__match(args)
+        match, idx = self.__match(self._idx, args)
 
-        result = node if match else None
+        result = ZPLnode._view(self._tree, idx) if match else None
         return result
 
     def __getitem__(self, child):
@@ -314,28 +543,24 @@ class ZPLnode(object):
 
         If no child matching the name[=value] selector exists, KeyError is raised
         """
-        idx = child.find("=")
-        if idx > 0:
-            key = child[:idx]
-            val = (child[idx + 1 :],)
-        else:
-            key = child
-            val = (None,)
+        key, val = _parse_selector(child)
         node = self.get(key, query=val)
         if not node:
             raise KeyError(child)
         return node
 
-    def __match(self, args):
-        node = None
+    def __match(self, idx, args):
+        tree  = self._tree
+        node  = -1
+        match = False
         part, filt = args[0]
 
-        for child in self.children:
-            match = child.name == part and ((not filt) or filt == child.value)
+        for child in tree.name_index.get((idx, part), ()):
+            match = (not filt) or filt == tree.values[child]
             if match:
                 node = child
                 if len(args) > 1:
-                    match, node = child.__match(args[1:])
+                    match, node = self.__match(child, args[1:])
                 if match:
                     break
 
@@ -343,62 +568,71 @@ class ZPLnode(object):
 
     @property
     def name(self):
-        return self._name
+        return self._tree.names[self._idx]
 
     @property
     def value(self):
-        return self._value
+        return self._tree.values[self._idx]
 
     @value.setter
     def value(self, val):
-        self._value = val
+        self._tree.values[self._idx] = val
 
     @property
     def level(self):
-        return self._level
+        return self._tree.levels[self._idx]
 
     @property
     def children(self):
-        return iter(self._children)  # todo if only an iterable is appropriate.
+        tree = self._tree
+        return (ZPLnode._view(tree, child) for child in tree.iter_children(self._idx))
 
     def __str__(self):
-        result = ""
-        if self.level != 0:  # don't print node information for the root node
-            #            result += str(self.level) + ":"
-            result += "    " * (self.level - 1)
-            result += str(self.name)
-            if self.value:
-                result += " = " + self.value
-
-        for child in self.children:
-            result += "\n" + str(child)
-
-        return result
+        tree   = self._tree
+        names  = tree.names
+        values = tree.values
+        levels = tree.levels
+
+        lines = []
+        stack = [self._idx]
+        while stack:
+            idx   = stack.pop()
+            level = levels[idx]
+            if level == 0:  # don't print node information for the root node
+                lines.append("")
+            else:
+                line = "    " * (level - 1) + str(names[idx])
+                if values[idx]:
+                    line += " = " + values[idx]
+                lines.append(line)
+            # push in reverse, so that children are popped in order
+            stack.extend(reversed(list(tree.iter_children(idx))))
+
+        return "\n".join(lines)
 
 
 def load_cfg(bytes_stream, encoding='utf-8'):
     """root_node = load_cfg(linelist, encoding='utf-8')
 
-    loads a ZPL stream (an iterable yielding one line at a time) into a hiearchy of ZPLnode
-    instances, returning the root node.
+    loads a ZPL stream (an iterable yielding one line at a time) into a ZPLTree, returning a
+    ZPLnode for the root node.
     """
 
-    root  = ZPLnode()
-    roots = [root]
+    tree  = ZPLTree()
+    roots = [0]
     for propnames, value in load_stream(bytes_stream, encoding=encoding, emit_empty=True):
         # call load_stream with emit_empty=True to make it return all nodes. This simplifies
         # creating sub-trees, and ensures that the maximum increate in depth is 1
         level = len(propnames)
 
-        # Because the maximum increase in level is 1, and we slice 'roots' to the current
+        # Because the maximum increase in level is 1, and we truncate 'roots' to the current
         # level, this works regardless of indent
-        roots  = roots[:level]  # levels are 0-based, so the length is always 1 more than the level
+        del roots[level:]  # levels are 0-based, so the length is always 1 more than the level
         parent = roots[level - 1]
         name   = propnames[-1]
-        child  = ZPLnode(name=name, value=value, parent=parent)
-        roots.append(child)
+        roots.append(tree.add(parent, name, value))
 
-    return root
+    return ZPLnode._view(tree, 0)
 
 
 def main(args=sys.argv[1:]):
@@ -1,9 +1,4 @@
 # -*- coding: utf-8 -*-
-from __future__ import division
-from __future__ import print_function
-from __future__ import absolute_import
-from __future__ import unicode_literals
-
 import io
 import collections
 import functools as ft
@@ -116,6 +111,23 @@ NESTED_1_TREE = {'root': {'branch': {'leafname': "leafval"}}}
 
 NESTED_1_TREE_FLAT = {"root:branch:leafname": "leafval"}
 
+FIXTURE_1_DUMP = """
+context
+    iothreads = 1
+    verbose = 1
+main
+    type = zmq_queue
+    frontend
+        option
+            hwm = 1000
+            swap = 25000000
+            subscribe = "#2"
+        bind = tcp://eth0:5555
+    backend
+        bind = tcp://eth0:5556
+""".lstrip()
+
+
 Case = collections.namedtuple("Case", ['name', 'call', 'data', 'expected'])
 
 UNUSED_TEST_CASES = []
@@ -136,6 +148,54 @@ LOAD_TEST_CASES = [
     ),
     Case(name="loads config", call=pyzpl.loads, data=FIXTURE_2_DATA, expected=FIXTURE_2_TREE),
     Case(name="loads nested", call=pyzpl.loads, data=NESTED_1_DATA , expected=NESTED_1_TREE),
+    Case(
+        name="load lone carriage-returns",
+        call=(lambda data: pyzpl.load(io.BytesIO(data))),
+        data=b"a\r    b = 1\rc = 2\r",
+        expected={'a': {'b': "1"}, 'c': "2"},
+    ),
+    Case(
+        name="loads lone carriage-returns",
+        call=pyzpl.loads,
+        data=b"a\r    b = 1\rc = 2\r",
+        expected={'a': {'b': "1"}, 'c': "2"},
+    ),
+    Case(
+        name="loads line-endings",
+        call=pyzpl.loads,
+        data=b"a = 1\rb = 2\r\nc = 3\n",
+        expected={'a': "1", 'b': "2", 'c': "3"},
+    ),
+    Case(
+        name="loads comments",
+        call=pyzpl.loads,
+        data=b"# top = x\na\n    #b = y\n    = z\n    c = 1  # trailing\n",
+        expected={'a': {'c': "1"}},
+    ),
+    Case(
+        name="loads reopened section",
+        call=pyzpl.loads,
+        data=b"a\n    b\n        c = 1\n    d = 2\ne = 3\na\n    b\n        f = 4\n",
+        expected={'a': {'b': {'c': "1", 'f': "4"}, 'd': "2"}, 'e': "3"},
+    ),
+    Case(
+        name="pyzpl2 loads reopened section",
+        call=pyzpl2.loads,
+        data=b"a\n    b\n        c = 1\n    d = 2\ne = 3\na\n    b\n        f = 4\n",
+        expected={'a': {'b': {'c': "1", 'f': "4"}, 'd': "2"}, 'e': "3"},
+    ),
+    Case(
+        name="loads shared parent prefix",
+        call=pyzpl.loads,
+        data=b"a\n    b\n        c = 1\n    g\n        c = 2\n    b\n        d = 3\n",
+        expected={'a': {'b': {'c': "1", 'd': "3"}, 'g': {'c': "2"}}},
+    ),
+    Case(
+        name="pyzpl2 loads shared parent prefix",
+        call=pyzpl2.loads,
+        data=b"a\n    b\n        c = 1\n    g\n        c = 2\n    b\n        d = 3\n",
+        expected={'a': {'b': {'c': "1", 'd': "3"}, 'g': {'c': "2"}}},
+    ),
     Case(
         name="dumps nested 1", call=pyzpl.dumps, data=NESTED_1_TREE, expected=NESTED_1_DATA.decode()
     ),
@@ -145,6 +205,18 @@ LOAD_TEST_CASES = [
         data=NESTED_1_TREE_FLAT,
         expected=NESTED_1_DATA.decode(),
     ),
+    Case(
+        name="dumps flat tree",
+        call=pyzpl.dumps,
+        data=FIXTURE_1_FLAT_TREE,
+        expected=FIXTURE_1_DUMP,
+    ),
+    Case(
+        name="dumps flat key with nested val",
+        call=pyzpl.dumps,
+        data={"root:branch": {'leafname': "leafval"}},
+        expected=NESTED_1_DATA.decode(),
+    ),
     Case(
         name="dumps hello world",
         call=pyzpl.dumps,
@@ -157,9 +229,115 @@ LOAD_TEST_CASES = [
         data={'propname': "world with # hash (not a comment)"},
         expected="""propname = "world with # hash (not a comment)"\n""",
     ),
-    # TODO (mb 2016-11-22): Test cases for
-    #  - A value that starts with a quote and does not end in a
-    #    matching quote is treated as unquoted.
+    Case(
+        name="dumps val with quotes",
+        call=pyzpl.dumps,
+        data={'a': '"quoted" # hash', 'b': "'single'", 'c': 'say "hi"'},
+        expected="""a = '"quoted" # hash'\nb = "'single'"\nc = say "hi"\n""",
+    ),
+    Case(
+        name="pyzpl2 dumps nested 1",
+        call=pyzpl2.dumps,
+        data=NESTED_1_TREE,
+        expected=NESTED_1_DATA.decode(),
+    ),
+    Case(
+        name="pyzpl2 dumps flat tree",
+        call=pyzpl2.dumps,
+        data=FIXTURE_1_FLAT_TREE,
+        expected=FIXTURE_1_DUMP,
+    ),
+    Case(
+        name="pyzpl2 dumps val with quotes",
+        call=pyzpl2.dumps,
+        data={'a': '"quoted" # hash', 'b': "'single'", 'c': 'say "hi"'},
+        expected="""a = '"quoted" # hash'\nb = "'single'"\nc = say "hi"\n""",
+    ),
+    Case(
+        name="pyzpl2 dump_lines tuple names",
+        call=(lambda data: list(pyzpl2.dump_lines(data.items(), depth=1))),
+        data={('main', 'type'): "zmq_queue", ('main', 'frontend', 'bind'): "tcp://eth0:5555"},
+        expected=[
+            "    main",
+            "        type = zmq_queue",
+            "        frontend",
+            "            bind = tcp://eth0:5555",
+        ],
+    ),
+    Case(
+        name="loads val with hash",
+        call=pyzpl.loads,
+        data=b"""propname = "world with # hash (not a comment)"  # a comment\n""",
+        expected={'propname': "world with # hash (not a comment)"},
+    ),
+    Case(
+        name="loads single quoted val",
+        call=pyzpl.loads,
+        data=b"""propname = 'say "hello"'\n""",
+        expected={'propname': 'say "hello"'},
+    ),
+    Case(
+        name="loads non-ascii val",
+        call=pyzpl.loads,
+        data="propname = \"grüße # ✓\"\n".encode("utf-8"),
+        expected={'propname': "grüße # ✓"},
+    ),
+    Case(
+        name="loads latin-1 val",
+        call=ft.partial(pyzpl.loads, encoding="latin-1"),
+        data="propname = grüße\n".encode("latin-1"),
+        expected={'propname': "grüße"},
+    ),
+    Case(
+        name="load utf-16 stream",
+        call=(lambda data: pyzpl.load(io.BytesIO(data), encoding="utf-16")),
+        data="root\n    propname = grüße\nother = 1\n".encode("utf-16"),
+        expected={'root': {'propname': "grüße"}, 'other': "1"},
+    ),
+    Case(
+        name="load utf-32 stream",
+        call=(lambda data: pyzpl.load(io.BytesIO(data), encoding="utf-32")),
+        data="root\n    propname = grüße\nother = 1\n".encode("utf-32"),
+        expected={'root': {'propname': "grüße"}, 'other': "1"},
+    ),
+    Case(
+        name="pyzpl2 loads utf-16",
+        call=ft.partial(pyzpl2.loads, encoding="utf-16"),
+        data="root\n    propname = grüße\nother = 1\n".encode("utf-16"),
+        expected={'root': {'propname': "grüße"}, 'other': "1"},
+    ),
+    Case(
+        name="pyzpl2 loads utf-32",
+        call=ft.partial(pyzpl2.loads, encoding="utf-32"),
+        data="root\n    propname = grüße\nother = 1\n".encode("utf-32"),
+        expected={'root': {'propname': "grüße"}, 'other': "1"},
+    ),
+    Case(
+        name="pyzpl2 load utf-16 stream",
+        call=(lambda data: pyzpl2.load(io.BytesIO(data), encoding="utf-16")),
+        data="root\n    propname = grüße\nother = 1\n".encode("utf-16"),
+        expected={'root': {'propname': "grüße"}, 'other': "1"},
+    ),
+    Case(
+        name="pyzpl2 load_cfg utf-16 stream",
+        call=(
+            lambda data: str(pyzpl2.load_cfg(io.BytesIO(data), encoding="utf-16")).strip()
+        ),
+        data="root\n    propname = grüße\nother = 1\n".encode("utf-16"),
+        expected="root\n    propname = grüße\nother = 1",
+    ),
+    Case(
+        name="loads utf-16",
+        call=ft.partial(pyzpl.loads, encoding="utf-16"),
+        data="root\n    propname = grüße\n".encode("utf-16"),
+        expected={'root': {'propname': "grüße"}},
+    ),
+    Case(
+        name="loads unmatched quote",
+        call=pyzpl.loads,
+        data=b"""propname = "world # unquoted\n""",
+        expected={'propname': '"world'},
+    ),
 ]
 
 
@@ -178,11 +356,18 @@ def test_load(name, call, data, expected):
     assert result == expected
 
 
-def test_full_cycle():
-    tree1 = pyzpl.loads(FIXTURE_2_DATA)
-    data1 = pyzpl.dumps(tree1         ).encode('ascii')
-    tree2 = pyzpl.loads(data1)
-    data2 = pyzpl.dumps(tree2         ).encode('ascii')
+@pytest.mark.parametrize("loads", [pyzpl.loads, pyzpl2.loads])
+def test_value_with_children(loads):
+    with pytest.raises(ValueError, match="Property 'a:b' has both a value and children"):
+        loads(b"a\n    b = 1\na\n    b\n        c = 2\n")
+
+
+@pytest.mark.parametrize("zpl", [pyzpl, pyzpl2])
+def test_full_cycle(zpl):
+    tree1 = zpl.loads(FIXTURE_2_DATA)
+    data1 = zpl.dumps(tree1         ).encode('ascii')
+    tree2 = zpl.loads(data1)
+    data2 = zpl.dumps(tree2         ).encode('ascii')
 
     assert FIXTURE_2_TREE == tree1
     assert FIXTURE_2_TREE == tree2
@@ -191,6 +376,56 @@ def test_full_cycle():
     assert FIXTURE_2_DATA == data2
 
 
+def test_c_load_lines():
+    _parser = pytest.importorskip("pyzpl._parser")
+    data    = b"""
+a=b
+bad name = ignored
+    x = "quoted # val"  # comment
+    y = 'single' trailing
+    z = "unmatched # comment
+\t= tab
+q =
+    r = ""
+    s = # only a comment
+1. header
+""" + b" " * 12 + b"\n" + FIXTURE_1_DATA + b"\n" + FIXTURE_2_DATA
+
+    lines    = data.splitlines()
+    expected = list(pyzpl._py_load_lines(lines, "utf-8"))
+    assert list(_parser.load_lines(lines, "utf-8")) == expected
+
+    data     = b"a = 1\r\nb\r    c = 2\r\n\r\n    d = 3\n\re = 4\r\n" + data + b"\r"
+    expected = list(pyzpl._py_load_buffer(data, "utf-8"))
+    assert expected[:4] == [(('a',), "1"), (('b', 'c'), "2"), (('b', 'd'), "3"), (('e',), "4")]
+    assert list(_parser.load_buffer(data, "utf-8")) == expected
+
+    with pytest.raises(ValueError, match="Illegal indent on line 2"):
+        list(_parser.load_lines([b"a = b", b"  c = d"], "utf-8"))
+    with pytest.raises(ValueError, match="Illegal indent on line 2"):
+        list(_parser.load_buffer(b"a\n  b = c", "utf-8"))
+    with pytest.raises(ValueError, match="Illegal indent on line 3"):
+        list(_parser.load_buffer(b"a\n    b\n          c = d", "utf-8"))
+
+
+@pytest.mark.parametrize("loads", [pyzpl.loads, pyzpl2.loads])
+def test_illegal_indent_lineno(loads):
+    with pytest.raises(ValueError, match="Illegal indent on line 2"):
+        loads(b"a = b\n  c = d\n")
+
+
+def test_loads_returns_copies():
+    tree1 = pyzpl.loads(FIXTURE_2_DATA)
+    tree1['apps']['listener']['context']['iothreads'] = "2"
+    tree2 = pyzpl.loads(FIXTURE_2_DATA)
+
+    assert tree1 is not tree2
+    assert FIXTURE_2_TREE == tree2
+
+    pyzpl.clear_loads_cache()
+    assert FIXTURE_2_TREE == pyzpl.loads(FIXTURE_2_DATA)
+
+
 FIXTURE_3_DATA = b"""
 # Basement printer
 node = basement
@@ -270,6 +505,9 @@ def test_hiearchical():
         node = cfg["node=garage"]
     assert "node=garage" in str(excinfo.value)
 
+    # path below a leaf node
+    assert cfg.get("node:ip:port") is None
+
     # get() access
     node = cfg.get("node")  # get the first node (unqualified)
     assert node != None
@@ -283,6 +521,16 @@ def test_hiearchical():
     assert ip1       == ip2 == ip3
     assert ip1.value == "10.1.2.3"
 
+    # lists are parsed without the path cache, repeated paths are cached
+    assert cfg.get(["node", "ip"]) == ip3
+    assert cfg.get(("node", "ip")) == ip3
+
+    front1 = cfg.get("node", query=["front door"])
+    front2 = cfg.get("node", query="front door")
+    assert front1 != None
+    assert front1       == front2
+    assert front1.value == "front door"
+
     auth = cfg.get("authorized_users:authorization")
     assert auth != None
     assert auth.value == "simple"
@@ -337,3 +585,17 @@ def test_hiearchical():
     # return is a dump of the tree (root node). It should match the
     # input, less blank lines and comments
     assert str(cfg).strip().encode() == FIXTURE_3_OUT
+
+
+def test_node_construction():
+    root  = pyzpl2.ZPLnode()
+    node  = pyzpl2.ZPLnode(name="node", value="basement", parent=root)
+    port1 = pyzpl2.ZPLnode(name="port", value="2001", parent=node)
+    port2 = pyzpl2.ZPLnode(name="port", value="2002", parent=node)
+
+    assert root.level == 0
+    assert port1.level == 2
+    assert root.get("node:port") == port1
+    assert root.get("node:port", query="2002") == port2
+    assert [child.value for child in node.children] == ["2001", "2002"]
+    assert str(node) == "node = basement\n    port = 2001\n    port = 2002"